@@ -1,7 +1,15 @@
 import streamlit as st
-import pickle
+from string import Template
+import warnings
+import joblib
+import numpy as np
 import pandas as pd
-import plotly.express as px
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.preprocessing import FunctionTransformer
+
+# transform_row feeds positional arrays to sub-transformers fitted on a
+# DataFrame; the columns are already resolved, so this warning doesn't apply
+warnings.filterwarnings('ignore', message='X does not have valid feature names', category=UserWarning)
 
 # Constants
 MATERIAL_RATES = {
@@ -59,13 +67,161 @@ EFFICIENCY_FACTORS = {
 
 RISK_FACTORS = {'prelim': 0.05, 'cont': 0.075, 'design': 0.02}
 CIRCULATION_SPACE = 0.20
-STANDARD_WORK_HOURS = 8
 OVERHEAD_PROFIT = 0.15
 
-# Load artifacts
-model = pickle.load(open('cost_only_model.pkl', 'rb'))
-preprocessor = pickle.load(open('preprocessor_cost.pkl', 'rb'))
-metrics = pickle.load(open('metrics_cost.pkl', 'rb'))
+# Rate tables for estimate(). Streamlit re-executes this script on every
+# widget interaction, so they are built once per process in a cached factory
+# rather than at module level. Rows follow _BT_IDX; material columns are
+# (cement, blocks, steel, sand, granite), labor columns (foundation,
+# structural, finishing). Crew-size buckets are <15, 15-30 and >30 workers.
+@st.cache_resource
+def build_rate_tables():
+    bt_idx = {bt: i for i, bt in enumerate(MATERIAL_RATES)}
+    mat_rates = np.array([
+        [MATERIAL_RATES[bt][k] for k in ('cement', 'blocks', 'steel', 'sand', 'granite')]
+        for bt in bt_idx
+    ])
+    prod = np.array([
+        [LABOR_PRODUCTIVITY_RATES[bt][k] for k in ('foundation', 'structural', 'finishing')]
+        for bt in bt_idx
+    ])
+    plant = np.array([PLANT_RATES[bt] for bt in bt_idx])
+    crew_bounds = np.array([15, 31])
+    crew_eff = np.array([EFFICIENCY_FACTORS['crew_size'][k] for k in ('Small', 'Medium', 'Large')])
+    weather_idx = {w: i for i, w in enumerate(EFFICIENCY_FACTORS['weather'])}
+    weather_eff = np.array(list(EFFICIENCY_FACTORS['weather'].values()))
+    risk_vec = np.array([RISK_FACTORS['cont'], RISK_FACTORS['prelim'], RISK_FACTORS['design']])
+    return (bt_idx, mat_rates, prod, plant, crew_bounds, crew_eff,
+            weather_idx, weather_eff, risk_vec)
+
+# Names for the risk allowances in build_rate_tables' risk vector
+_RISK_NAMES = ('Contingencies', 'Preliminaries', 'Design Risk')
+
+# Chart colours (first entries of plotly's qualitative Pastel and Pastel1)
+_PASTEL = ('rgb(102, 197, 204)', 'rgb(246, 207, 113)', 'rgb(248, 156, 116)', 'rgb(220, 176, 242)')
+_PASTEL1 = ('rgb(251,180,174)', 'rgb(179,205,227)', 'rgb(204,235,197)')
+
+# HTML templates for the metric boxes
+_GFA_TPL = Template("""
+<div class='metric-box'>
+    <h3>Gross Floor Area (GFA)</h3>
+    <h2 class='highlight'>$v m²</h2>
+</div>
+""")
+_TOTAL_TPL = Template("""
+<div class='metric-box'>
+    <h3>Total Construction Cost</h3>
+    <h2 class='highlight'>₦$v</h2>
+    <p>Professional estimate accounting for material, labor, plant, and risk factors</p>
+</div>
+""")
+_R2_TPL = Template("""
+<div class='metric-box'>
+    <h4>$title</h4>
+    <p>R²: <span class='highlight'>$v</span></p>
+</div>
+""")
+
+# Model input columns, in the order the preprocessor was fitted on
+_COLS = (
+    'Length', 'Breadth', 'Storeys', 'Shape', 'Type', 'Location', 'Soil', 'Access', 'Weather',
+    'Cement_Price', 'Block_Price', 'Steel_Price', 'Sand_Price', 'Granite_Price',
+    'Labor_Rate', 'Workers', 'Permit_Months', 'Labor_Cost',
+    'Shape_Complexity', 'Vertical_Complexity', 'Site_Difficulty'
+)
+
+# A representative row, used to check transform_row against preprocessor.transform
+_SAMPLE_ROW = [
+    20, 15, 2, 'Rectangular', 'Residential', 'Urban', 'Rocky', 'Good', 'Good',
+    9800, 600, 850000, 35000, 19500, 1000, 20, 3, 1000000.0, 1.0, 0.5, 1.5
+]
+
+# Load artifacts once per process rather than on every rerun. mmap_mode only
+# affects plain ndarrays in files written by joblib.dump; sklearn trees copy
+# their node arrays on unpickling, so it does not reduce the forest's memory.
+@st.cache_resource
+def load_artifacts():
+    model = joblib.load('cost_only_model.pkl', mmap_mode='r')
+    preprocessor = joblib.load('preprocessor_cost.pkl', mmap_mode='r')
+    metrics = joblib.load('metrics_cost.pkl')
+    # Single-row predictions don't benefit from a thread pool
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = 1
+    return model, preprocessor, metrics, verified_transform_plan(preprocessor)
+
+def build_transform_plan(preprocessor):
+    # Resolve each fitted ColumnTransformer branch to positions in _COLS so a
+    # row can be transformed without building a DataFrame. Returns None when
+    # the preprocessor can't be replayed exactly this way.
+    if (not hasattr(preprocessor, 'transformers_')
+            or getattr(preprocessor, 'sparse_output_', False)
+            or getattr(preprocessor, 'transformer_weights', None)):
+        return None
+    fitted_cols = list(preprocessor.feature_names_in_)
+    plan = []
+    for _, trans, cols in preprocessor.transformers_:
+        if isinstance(trans, str):
+            if trans == 'drop':
+                continue
+            return None
+        if isinstance(cols, (str, int)):
+            cols = [cols]
+        elif isinstance(cols, slice) or callable(cols):
+            return None
+        cols = list(cols)
+        if not cols:
+            continue
+        names = [fitted_cols[c] if isinstance(c, (int, np.integer)) else c for c in cols]
+        if any(name not in _COLS for name in names):
+            return None
+        idxs = [_COLS.index(name) for name in names]
+        plan.append((trans, idxs))
+    return plan
+
+def verified_transform_plan(preprocessor):
+    # Only use the plan if it reproduces preprocessor.transform on a sample
+    # row; any failure falls back to the full preprocessor
+    try:
+        plan = build_transform_plan(preprocessor)
+        if plan is None:
+            return None
+        fast = transform_row(preprocessor, plan, _SAMPLE_ROW)
+        full = preprocessor.transform(pd.DataFrame([_SAMPLE_ROW], columns=_COLS))
+        if hasattr(full, 'toarray'):
+            full = full.toarray()
+        full = np.asarray(full, dtype=np.float64)
+    except Exception:
+        return None
+    if fast.shape != full.shape or not np.allclose(fast, full):
+        return None
+    return plan
+
+def transform_row(preprocessor, plan, row):
+    if plan is None:
+        return preprocessor.transform(pd.DataFrame([row], columns=_COLS))
+    X = np.array([row], dtype=object)
+    blocks = []
+    for trans, idxs in plan:
+        if isinstance(trans, FunctionTransformer) and trans.func is None:
+            # Fitted 'passthrough' remainder: the numeric columns as-is
+            out = X[:, idxs].astype(np.float64)
+        else:
+            out = trans.transform(X[:, idxs])
+            if hasattr(out, 'toarray'):
+                out = out.toarray()
+        blocks.append(out)
+    return np.hstack(blocks)
+
+def predict_cost(model, processed):
+    # Forest regressors average their trees; doing that directly skips the
+    # forest's input validation and joblib dispatch for a single row
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)) and model.n_outputs_ == 1:
+        if hasattr(processed, 'toarray'):
+            processed = processed.toarray()
+        X = np.ascontiguousarray(processed, dtype=np.float32)
+        total = sum(tree.predict(X, check_input=False) for tree in model.estimators_)
+        return total / len(model.estimators_)
+    return model.predict(processed)
 
 # Page configuration
 st.set_page_config(
@@ -74,6 +230,10 @@ st.set_page_config(
     layout="wide"
 )
 
+model, preprocessor, metrics, transform_plan = load_artifacts()
+(_BT_IDX, _MAT_RATES_ARR, _PROD_ARR, _PLANT_ARR, _CREW_BOUNDS, _CREW_EFF,
+ _WEATHER_IDX, _WEATHER_EFF, _RISK_VEC) = build_rate_tables()
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -81,6 +241,7 @@ st.markdown("""
     .metric-box { padding: 20px; border-radius: 10px; background: #F4F6F6; margin: 10px 0; }
     .highlight { color: #2E86C1; font-weight: 700; }
     .sub-metric { padding: 10px; background: #EBF5FB; border-radius: 5px; margin: 5px 0; }
+    .metric-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 1rem; }
 </style>
 """, unsafe_allow_html=True)
 
@@ -88,6 +249,7 @@ st.markdown("""
 st.markdown("<h1 class='header'>🏗️ AI Construction Estimator</h1>", unsafe_allow_html=True)
 st.markdown("### Construction Cost & Productivity Prediction App")
 
+@st.cache_data(max_entries=128)
 def calculate_gfa(length, breadth, storeys, shape):
     base_area = length * breadth * storeys
     shape_multiplier = SHAPE_COMPLEXITY[shape]
@@ -99,18 +261,59 @@ def calculate_site_difficulty(soil, access):
     return soil_map[soil] * access_map[access]
 
 def calculate_labor_hours(gfa, building_type, crew_size, weather_condition):
-    base_hours = sum([
-        LABOR_PRODUCTIVITY_RATES[building_type]['foundation'],
-        LABOR_PRODUCTIVITY_RATES[building_type]['structural'],
-        LABOR_PRODUCTIVITY_RATES[building_type]['finishing']
-    ]) * gfa
+    phase_hours = _PROD_ARR[_BT_IDX[building_type]] * gfa
+    
+    crew_efficiency = _CREW_EFF[np.searchsorted(_CREW_BOUNDS, crew_size, side='right')]
+    weather_efficiency = _WEATHER_EFF[_WEATHER_IDX[weather_condition]]
+    
+    # Total hours plus the unadjusted (foundation, structural, finishing) split
+    return phase_hours.sum() / (crew_efficiency * weather_efficiency), phase_hours
+
+def compute_material_cost(building_type, gfa, cement, blocks, steel, sand, granite):
+    prices = np.array([cement, blocks, steel, sand, granite])
+    return float(gfa * np.dot(prices, _MAT_RATES_ARR[_BT_IDX[building_type]]))
+
+@st.cache_data(max_entries=256)
+def estimate(length, breadth, storeys, shape, building_type, location, soil, access, weather,
+             cement, blocks, steel, sand, granite, labor_rate, workers, permit):
+    # Everything behind a submit: cost breakdown, feature row and prediction.
+    # model, preprocessor and transform_plan are read as globals so they are
+    # not hashed.
+    gfa = calculate_gfa(length, breadth, storeys, shape)
+    labor_hours, phase_hours = calculate_labor_hours(gfa, building_type, workers, weather)
+    labor_cost = labor_hours * labor_rate * (1 + OVERHEAD_PROFIT)
+    site_difficulty = calculate_site_difficulty(soil, access)
+    material_cost = compute_material_cost(building_type, gfa, cement, blocks, steel, sand, granite)
+    plant_cost = (material_cost + labor_cost) * _PLANT_ARR[_BT_IDX[building_type]]
+    base_cost = material_cost + labor_cost + plant_cost
+    risk_vals = base_cost * _RISK_VEC
     
-    crew_efficiency = EFFICIENCY_FACTORS['crew_size']['Medium' if 15 <= crew_size <= 30 
-                                                     else 'Large' if crew_size > 30 
-                                                     else 'Small']
-    weather_efficiency = EFFICIENCY_FACTORS['weather'][weather_condition]
+    # Feature calculations
+    shape_complexity = SHAPE_COMPLEXITY[shape]
+    vertical_complexity = storeys * 0.25
     
-    return base_hours / (crew_efficiency * weather_efficiency)
+    # Create input row in _COLS order
+    row = [
+        length, breadth, storeys, shape, building_type, location, soil, access, weather,
+        cement, blocks, steel, sand, granite,
+        labor_rate,  # User-provided hourly rate
+        workers, permit,
+        labor_cost,  # Calculated total labor cost
+        shape_complexity, vertical_complexity, site_difficulty
+    ]
+    
+    # Make prediction
+    processed = transform_row(preprocessor, transform_plan, row)
+    total_cost = predict_cost(model, processed)[0]
+    
+    return {
+        'total_cost': float(total_cost),
+        'phase_hours': phase_hours,
+        'labor_cost': float(labor_cost),
+        'material_cost': material_cost,
+        'plant_cost': float(plant_cost),
+        'risk_vals': risk_vals
+    }
 
 # Building dimensions section
 st.markdown("### 📐 Building Dimensions")
@@ -124,14 +327,16 @@ with col_dim2:
     storeys = st.slider("Number of Floors", 1, 10, 2, key="storeys_input")
     shape = st.selectbox("Building Shape", list(SHAPE_COMPLEXITY.keys()), key="shape_input")
 
-# Calculate and display GFA instantly
+# Calculate and display GFA instantly; the HTML is only rebuilt when the
+# dimensions change. Streamlit drops elements that are not re-emitted on a
+# rerun, so the placeholder is still written every time.
 current_gfa = calculate_gfa(length, breadth, storeys, shape)
-st.markdown(f"""
-<div class='metric-box'>
-    <h3>Gross Floor Area (GFA)</h3>
-    <h2 class='highlight'>{current_gfa:.2f} m²</h2>
-</div>
-""", unsafe_allow_html=True)
+dims = (length, breadth, storeys, shape)
+if st.session_state.get('_last_dims') != dims:
+    st.session_state['_last_dims'] = dims
+    st.session_state['_gfa_html'] = _GFA_TPL.substitute(v=f"{current_gfa:.2f}")
+gfa_placeholder = st.empty()
+gfa_placeholder.markdown(st.session_state['_gfa_html'], unsafe_allow_html=True)
 
 # Main form for other inputs
 with st.form("project_input"):
@@ -163,59 +368,20 @@ with st.form("project_input"):
     submit_button = st.form_submit_button("🚀 Generate Estimate")
     
     if submit_button:
-        # Calculate labor hours and productivity
-        labor_hours = calculate_labor_hours(current_gfa, building_type, workers, weather)
-        labor_productivity = current_gfa / (labor_hours * workers)
-        project_duration = labor_hours / (workers * STANDARD_WORK_HOURS)
-        
-        # Calculate labor cost including overhead
-        labor_cost = labor_hours * labor_rate * (1 + OVERHEAD_PROFIT)
-        
-        # Feature calculations
-        site_difficulty = calculate_site_difficulty(soil, access)
-        shape_complexity = SHAPE_COMPLEXITY[shape]
-        vertical_complexity = storeys * 0.25
-        
-        # Create input data with ALL required columns
-        input_data = pd.DataFrame([{
-            'Length': length,
-            'Breadth': breadth,
-            'Storeys': storeys,
-            'Shape': shape,
-            'Type': building_type,
-            'Location': location,
-            'Soil': soil,
-            'Access': access,
-            'Weather': weather,
-            'Cement_Price': cement,
-            'Block_Price': blocks,
-            'Steel_Price': steel,
-            'Sand_Price': sand,
-            'Granite_Price': granite,
-            'Labor_Rate': labor_rate,  # User-provided hourly rate
-            'Labor_Cost': labor_cost,  # Calculated total labor cost
-            'Workers': workers,
-            'Permit_Months': permit,
-            'Site_Difficulty': site_difficulty,
-            'Shape_Complexity': shape_complexity,
-            'Vertical_Complexity': vertical_complexity
-        }])
+        # Plotly is only needed for the results charts
+        import plotly.graph_objects as go
         
-        # Make prediction
-        processed = preprocessor.transform(input_data)
-        total_cost = model.predict(processed)[0]
+        # Cost breakdown and prediction, cached on the inputs
+        est = estimate(
+            length, breadth, storeys, shape, building_type, location, soil, access, weather,
+            cement, blocks, steel, sand, granite, labor_rate, workers, permit
+        )
         
         # Display results
         st.success("## 📊 Estimation Results")
         
         # Cost Results
-        st.markdown(f"""
-        <div class='metric-box'>
-            <h3>Total Construction Cost</h3>
-            <h2 class='highlight'>₦{total_cost:,.0f}</h2>
-            <p>Professional estimate accounting for material, labor, plant, and risk factors</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_TOTAL_TPL.substitute(v=f"{est['total_cost']:,.0f}"), unsafe_allow_html=True)
         
         # Productivity Results
         #st.markdown(f"""
@@ -230,75 +396,47 @@ with st.form("project_input"):
         #</div>
         #""", unsafe_allow_html=True)
         
-        # Cost breakdown
-        material_cost = sum([
-            cement * MATERIAL_RATES[building_type]['cement'] * current_gfa,
-            blocks * MATERIAL_RATES[building_type]['blocks'] * current_gfa,
-            steel * MATERIAL_RATES[building_type]['steel'] * current_gfa,
-            sand * MATERIAL_RATES[building_type]['sand'] * current_gfa,
-            granite * MATERIAL_RATES[building_type]['granite'] * current_gfa
-        ])
-        
-        plant_cost = (material_cost + labor_cost) * PLANT_RATES[building_type]
-        base_cost = material_cost + labor_cost + plant_cost
-        
-        # Risk calculations
-        risk_components = {
-            'Contingencies': base_cost * RISK_FACTORS['cont'],
-            'Preliminaries': base_cost * RISK_FACTORS['prelim'],
-            'Design Risk': base_cost * RISK_FACTORS['design']
-        }
-        
         # Visualizations
         col_viz1, col_viz2 = st.columns(2)
         with col_viz1:
-            fig_main = px.pie(
-                names=['Materials', 'Labor', 'Plant', 'Risks'],
-                values=[material_cost, labor_cost, plant_cost, sum(risk_components.values())],
-                title="Cost Distribution",
-                color_discrete_sequence=px.colors.qualitative.Pastel
-            )
+            fig_main = go.Figure(go.Pie(
+                labels=['Materials', 'Labor', 'Plant', 'Risks'],
+                values=[est['material_cost'], est['labor_cost'], est['plant_cost'], est['risk_vals'].sum()],
+                marker={'colors': _PASTEL}
+            ))
+            fig_main.update_layout(title="Cost Distribution")
             st.plotly_chart(fig_main, use_container_width=True)
             
         with col_viz2:
-            fig_risk = px.pie(
-                names=list(risk_components.keys()),
-                values=list(risk_components.values()),
-                title="Risk Factors Breakdown",
-                color_discrete_sequence=px.colors.qualitative.Pastel1
-            )
+            fig_risk = go.Figure(go.Pie(
+                labels=_RISK_NAMES,
+                values=est['risk_vals'].tolist(),
+                marker={'colors': _PASTEL1}
+            ))
+            fig_risk.update_layout(title="Risk Factors Breakdown")
             st.plotly_chart(fig_risk, use_container_width=True)
         
         # Productivity visualization
-        fig_productivity = px.bar(
+        fig_productivity = go.Figure(go.Bar(
             x=['Foundation', 'Structural', 'Finishing'],
-            y=[
-                LABOR_PRODUCTIVITY_RATES[building_type]['foundation'] * current_gfa,
-                LABOR_PRODUCTIVITY_RATES[building_type]['structural'] * current_gfa,
-                LABOR_PRODUCTIVITY_RATES[building_type]['finishing'] * current_gfa
-            ],
+            y=est['phase_hours']
+        ))
+        fig_productivity.update_layout(
             title="Labor Hours by Construction Phase",
-            labels={'x': 'Phase', 'y': 'Hours Required'}
+            xaxis_title="Phase",
+            yaxis_title="Hours Required"
         )
         st.plotly_chart(fig_productivity, use_container_width=True)
        
-        # Model metrics
-        st.markdown("### 🧠 Model Performance")
-        col_met1, col_met2 = st.columns(2)
-        with col_met1:
-            st.markdown(f"""
-            <div class='metric-box'>
-                <h4>Training Performance</h4>
-                <p>R²: <span class='highlight'>{metrics['train_r2']:.3f}</span></p>
-            </div>
-            """, unsafe_allow_html=True)
-        with col_met2:
-            st.markdown(f"""
-            <div class='metric-box'>
-                <h4>Validation Performance</h4>
-                <p>R²: <span class='highlight'>{metrics['test_r2']:.3f}</span></p>
-            </div>
-            """, unsafe_allow_html=True)
+        # Model metrics, sent as one markdown element laid out by .metric-grid.
+        # Boxes are stripped so no blank line ends the HTML block early.
+        parts = [
+            "<div class='metric-grid'>",
+            _R2_TPL.substitute(title="Training Performance", v=f"{metrics['train_r2']:.3f}").strip(),
+            _R2_TPL.substitute(title="Validation Performance", v=f"{metrics['test_r2']:.3f}").strip(),
+            "</div>"
+        ]
+        st.markdown("### 🧠 Model Performance\n\n" + "\n".join(parts), unsafe_allow_html=True)
 
 if __name__ == "__main__":
     pass
\ No newline at end of file